@@ -1,96 +1,314 @@
 # extractor.py
 import os
+import re
+import shutil
+import struct
 import zipfile
-import json
+import zlib
+from concurrent.futures import Executor, Future
 from lxml import etree
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+# Prefer orjson (Rust) for parsing JSON exports; fall back to stdlib json.
+# Both accept bytes, so files are read without a separate utf-8 decode.
+# stdlib json is also the retry for exports orjson rejects (see _load_document).
+import json
+try:
+    import orjson
+    json_loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except Exception:
+    json_loads = json.loads
+    ORJSON_AVAILABLE = False
+
+# libdeflate (via the `deflate` package) inflates DEFLATE zip entries 2-3x faster
+# than zlib; entries above LIBDEFLATE_MAX_ENTRY bytes (it needs the whole entry in
+# memory) and non-deflate/encrypted entries go through zipfile's streaming reader.
+try:
+    import deflate as libdeflate
+    LIBDEFLATE_AVAILABLE = True
+except Exception:
+    libdeflate = None
+    LIBDEFLATE_AVAILABLE = False
+LIBDEFLATE_MAX_ENTRY = 64 * 1024 * 1024
+
+# Entry suffixes a lazy extraction still writes to disk (parser inputs).
+_LAZY_EXTRACT_SUFFIXES = (".xml", ".json", ".txt", ".vcf")
+
+# Precompiled XPath expressions (compiled once instead of per findall call).
+# UFDR-style report sections
+_XP_CONTACT = etree.XPath(".//Contacts/Contact")
+_XP_CALL = etree.XPath(".//CallLogs/Call")
+# generic lowercase variants
+_XP_GEN_MESSAGE = etree.XPath(".//message")
+_XP_GEN_CHATMESSAGE = etree.XPath(".//chatmessage")
+_XP_GEN_SMS = etree.XPath(".//sms")
+_XP_GEN_CONVERSATION = etree.XPath(".//conversation")
+_XP_GEN_CONTACT = etree.XPath(".//contact")
+_XP_GEN_CONTACT_ENTRY = etree.XPath(".//contactEntry")
+_XP_GEN_PHONE = etree.XPath(".//phone")
+_XP_GEN_EMAIL = etree.XPath(".//email")
+_XP_GEN_CALL = etree.XPath(".//call")
+_XP_GEN_CALL_ENTRY = etree.XPath(".//callEntry")
+
+# Filename heuristics for manifest bucketing: one alternation per bucket so the
+# C regex engine scans each path once instead of a Python loop over tokens.
+_CHAT_RE = re.compile(r"chat|message|sms|im|conversation")
+_CALL_RE = re.compile(r"call")
+_CONTACT_RE = re.compile(r"contact|phonebook|\.vcf|vcard")
+_MEDIA_RE = re.compile(r"image|photo|video|audio")
+_REPORT_MEDIA_RE = re.compile(r"image|photo|video|audio|media|files")
 
 def ensure_dir(p):
     os.makedirs(p, exist_ok=True)
 
 
-def extract_ufdr(ufdr_path: str, out_dir: str) -> Dict[str, Any]:
+def _element_raw(elem) -> Dict[str, Any]:
+    """
+    Compact, JSON-serializable snapshot of an XML element for the `raw` field:
+    tag, attributes and direct child element texts (no XML re-serialization).
+    """
+    return {
+        "tag": elem.tag,
+        "attrs": dict(elem.attrib),
+        "children": {c.tag: c.text for c in elem if isinstance(c.tag, str)},
+    }
+
+
+def _load_document(path: str, parse_xml: bool = True):
+    """
+    Sniff the first non-whitespace byte from a 4 KiB head read and load the file
+    as JSON or XML. Returns ("json", obj) or ("xml", root_element); with
+    parse_xml=False XML files are only detected, returning ("xml", None).
+    JSON reuses the head bytes already read; XML is handed to libxml2 by path so
+    it does its own buffered I/O without a Python-side copy of the file.
+    Both tolerate invalid UTF-8 (JSON drops the bytes, libxml2 recovers), and
+    JSON accepts the NaN/Infinity literals stdlib json allows.
+    """
+    with open(path, "rb") as f:
+        chunks, first = [], b""
+        while True:
+            head = f.read(4096)
+            if not head:
+                break
+            chunks.append(head)
+            first = head.lstrip()[:1]
+            if first:
+                break
+        if first in (b"{", b"["):
+            chunks.append(f.read())
+            raw = b"".join(chunks)
+            try:
+                return "json", json_loads(raw)
+            except ValueError:
+                # invalid UTF-8 (drop the bad bytes) or NaN/Infinity literals,
+                # which orjson rejects: retry with the more lenient stdlib json
+                return "json", json.loads(raw.decode("utf-8", errors="ignore"))
+    return "xml", etree.parse(path, etree.XMLParser(recover=True)).getroot() if parse_xml else None
+
+
+def _walk(root: str):
+    """
+    Iterative os.scandir walk yielding DirEntry objects for every non-directory
+    under root. DirEntry caches its type, so no extra stat() per entry.
+    """
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        yield entry
+        except OSError:
+            continue
+
+
+def _member_target(out_dir: str, name: str) -> Optional[str]:
+    """Sanitized on-disk path for a zip member (drops '', '.', '..' and drive parts)."""
+    arcname = os.path.splitdrive(name.replace("/", os.sep))[1]
+    parts = [p for p in arcname.split(os.sep) if p not in ("", os.curdir, os.pardir)]
+    return os.path.join(out_dir, *parts) if parts else None
+
+
+def _extract_member(z: zipfile.ZipFile, fh, info: zipfile.ZipInfo, out_dir: str):
+    target = _member_target(out_dir, info.filename)
+    if target is None:
+        return
+    if info.is_dir():
+        ensure_dir(target)
+        return
+    ensure_dir(os.path.dirname(target))
+    if (LIBDEFLATE_AVAILABLE and info.compress_type == zipfile.ZIP_DEFLATED
+            and not info.flag_bits & 0x1 and info.file_size <= LIBDEFLATE_MAX_ENTRY):
+        # read the raw DEFLATE stream after the local file header and inflate it in one call
+        fh.seek(info.header_offset)
+        header = fh.read(30)
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        fh.seek(info.header_offset + 30 + name_len + extra_len)
+        data = libdeflate.deflate_decompress(fh.read(info.compress_size), info.file_size)
+        if zlib.crc32(data) != info.CRC:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+        with open(target, "wb") as out:
+            out.write(data)
+        return
+    with z.open(info) as src, open(target, "wb") as out:
+        shutil.copyfileobj(src, out, 1 << 20)
+
+
+def open_archive_member(ref):
+    """
+    Open a lazily-referenced media entry, a (zip_path, inner_name) tuple from
+    extract_ufdr(..., lazy=True), as a streaming binary file object.
+    The caller closes it.
+    """
+    zip_path, inner_name = ref
+    z = zipfile.ZipFile(zip_path, "r")
+    try:
+        member = z.open(inner_name)
+    except Exception:
+        z.close()
+        raise
+    # closing the member does not close the archive; tie them together
+    close_member = member.close
+    def close():
+        close_member()
+        z.close()
+    member.close = close
+    return member
+
+
+def extract_ufdr(ufdr_path: str, out_dir: str, lazy: bool = False) -> Dict[str, Any]:
     """
     Unzip a .ufdr/.zip into out_dir and return a manifest.
     Manifest keys: root, report_xml, chats, calls, contacts, media
+    With lazy=True only parser inputs (xml/json/txt/vcf) are written to disk;
+    other entries stay in the archive and media entries are listed as
+    (ufdr_path, inner_name) tuples for open_archive_member().
     """
     ensure_dir(out_dir)
+    archive_media = []
     # try unzip (UFDR is ZIP-like)
-    with zipfile.ZipFile(ufdr_path, 'r') as z:
-        z.extractall(out_dir)
+    with zipfile.ZipFile(ufdr_path, 'r') as z, open(ufdr_path, "rb") as fh:
+        for info in z.infolist():
+            if lazy and not info.is_dir() and not info.filename.lower().endswith(_LAZY_EXTRACT_SUFFIXES):
+                if _MEDIA_RE.search(info.filename.lower()):
+                    archive_media.append((ufdr_path, info.filename))
+                continue
+            _extract_member(z, fh, info, out_dir)
+
+    # single walk of the extracted tree: report.xml candidates, other xml files,
+    # and the full (path, lowercased name) file list for the heuristics below
+    report_paths, xml_paths, files = [], [], []
+    for entry in _walk(out_dir):
+        if not entry.is_file():
+            continue
+        name = entry.name.lower()
+        if name == "report.xml":
+            report_paths.append(entry.path)
+        elif name.endswith(".xml"):
+            xml_paths.append(entry.path)
+        files.append((entry.path, name))
+    all_files = {os.path.normpath(p) for p, _ in files}
 
-    # locate report.xml (best-effort)
-    report_paths = list(Path(out_dir).rglob("report.xml"))
-    if not report_paths:
-        report_paths = list(Path(out_dir).rglob("*.xml"))
-    report_xml = str(report_paths[0]) if report_paths else None
+    # locate report.xml (best-effort); prefer the shallowest match
+    report_paths = report_paths or xml_paths
+    report_xml = min(report_paths, key=lambda p: p.count(os.sep)) if report_paths else None
 
     manifest = {
         "root": out_dir,
         "report_xml": report_xml,
-        "chats": [],
-        "calls": [],
-        "contacts": [],
-        "media": []
+        # insertion-ordered dicts double as ordered sets; converted to lists at the end
+        "chats": {},
+        "calls": {},
+        "contacts": {},
+        "media": {}
     }
 
     # if report.xml is available, attempt to map <file> entries and also consider
     # possibility that report.xml contains actual message elements.
     if report_xml:
         try:
-            tree = etree.parse(report_xml)
-            root = tree.getroot()
-            # collect <file> nodes referencing localPath or similar attributes
-            file_nodes = root.findall(".//file")
-            for f in file_nodes:
-                local = f.findtext("localPath") or f.findtext("LocalPath") or f.get("localPath") or f.get("path")
-                if not local:
+            # stream report.xml once: map <file> entries as they close and note
+            # whether the report itself carries message/call/contact elements.
+            has_msg = has_call = has_contact = False
+            in_file = 0
+            for event, elem in etree.iterparse(report_xml, events=("start", "end"), recover=True):
+                tag = elem.tag
+                if event == "start":
+                    if tag == "file":
+                        in_file += 1
                     continue
-                abspath = os.path.join(out_dir, local) if not os.path.isabs(local) else local
-                if os.path.exists(abspath):
-                    low = local.lower()
-                    if any(tok in low for tok in ("chat","message","sms","im","conversation")):
-                        manifest["chats"].append(abspath)
-                    elif "call" in low:
-                        manifest["calls"].append(abspath)
-                    elif "contact" in low or low.endswith(".vcf"):
-                        manifest["contacts"].append(abspath)
-                    elif any(tok in low for tok in ("image","photo","video","audio","media","files")):
-                        manifest["media"].append(abspath)
+                if not isinstance(tag, str):
+                    continue
+                low_tag = tag.rpartition("}")[2].lower()
+                if low_tag.startswith(("message", "sms", "chat", "conversation")):
+                    has_msg = True
+                elif low_tag.startswith("call"):
+                    has_call = True
+                elif low_tag.startswith(("contact", "vcard", "displayname")):
+                    has_contact = True
+
+                if tag == "file":
+                    in_file -= 1
+                    # collect <file> nodes referencing localPath or similar attributes
+                    local = elem.findtext("localPath") or elem.findtext("LocalPath") or elem.get("localPath") or elem.get("path")
+                    if local:
+                        if os.path.isabs(local):
+                            abspath = local
+                            exists = os.path.normpath(local) in all_files or os.path.exists(local)
+                        else:
+                            abspath = os.path.join(out_dir, local)
+                            exists = os.path.normpath(abspath) in all_files
+                        if exists:
+                            low = local.lower()
+                            if _CHAT_RE.search(low):
+                                manifest["chats"][abspath] = None
+                            elif _CALL_RE.search(low):
+                                manifest["calls"][abspath] = None
+                            elif "contact" in low or low.endswith(".vcf"):
+                                manifest["contacts"][abspath] = None
+                            elif _REPORT_MEDIA_RE.search(low):
+                                manifest["media"][abspath] = None
+                if in_file == 0:
+                    # keep memory flat: drop the finished element and its processed siblings
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
             # Also, sometimes report.xml itself contains <message>, <sms>, <call>, <contact> nodes:
             # If so, add report.xml to lists so parsers will inspect it.
-            text = Path(report_xml).read_text(encoding="utf-8", errors="ignore").lower()
-            if any(k in text for k in ("<message", "<sms", "<chat", "<conversation")):
-                manifest["chats"].append(report_xml)
-            if "<call" in text or "<callrecord" in text:
-                manifest["calls"].append(report_xml)
-            if "<contact" in text or "<vcard" in text or "displayname" in text:
-                manifest["contacts"].append(report_xml)
+            if has_msg:
+                manifest["chats"][report_xml] = None
+            if has_call:
+                manifest["calls"][report_xml] = None
+            if has_contact:
+                manifest["contacts"][report_xml] = None
         except Exception:
             # if parsing report.xml fails, fall back to directory scan below
             pass
 
     # fallback: scan extracted tree for likely files
-    for p in Path(out_dir).rglob("*"):
-        if not p.is_file():
-            continue
-        low = str(p).lower()
-        if low.endswith((".json", ".xml", ".txt")):
-            name = p.name.lower()
+    for path, name in files:
+        low = path.lower()
+        if name.endswith((".json", ".xml", ".txt")):
             # heuristics by name
-            if any(tok in name for tok in ("chat","message","sms","im","conversation")):
-                manifest["chats"].append(str(p))
-            elif any(tok in name for tok in ("call","calllog","calls")):
-                manifest["calls"].append(str(p))
-            elif any(tok in name for tok in ("contact","phonebook",".vcf","vcard")):
-                manifest["contacts"].append(str(p))
-        if any(tok in low for tok in ("image","photo","video","audio")):
-            manifest["media"].append(str(p))
-
-    # dedupe
+            if _CHAT_RE.search(name):
+                manifest["chats"][path] = None
+            elif _CALL_RE.search(name):
+                manifest["calls"][path] = None
+            elif _CONTACT_RE.search(name):
+                manifest["contacts"][path] = None
+        if _MEDIA_RE.search(low):
+            manifest["media"][path] = None
+
+    for ref in archive_media:
+        manifest["media"][ref] = None
+
     for k in ("chats","calls","contacts","media"):
-        manifest[k] = list(dict.fromkeys(manifest[k]))
+        manifest[k] = list(manifest[k])
     return manifest
 
 
@@ -104,11 +322,10 @@ def parse_chat_file(path: str) -> List[Dict[str, Any]]:
     """
     results = []
     try:
-        text = Path(path).read_text(encoding="utf-8", errors="ignore")
-        stripped = text.lstrip()
         # JSON path
-        if stripped.startswith("{") or stripped.startswith("["):
-            obj = json.loads(text)
+        kind, doc = _load_document(path, parse_xml=False)
+        if kind == "json":
+            obj = doc
             messages = None
             # common keys
             if isinstance(obj, dict):
@@ -139,58 +356,82 @@ def parse_chat_file(path: str) -> List[Dict[str, Any]]:
                     })
             return results
 
-        # XML path
-        xmlroot = etree.fromstring(text.encode("utf-8"))
-
-        # Try to extract device identifier (phone number) from Metadata if present
-        device_phone = None
-        try:
-            dp = xmlroot.find(".//DeviceInformation/PhoneNumber")
-            if dp is not None and dp.text:
-                device_phone = dp.text.strip()
-        except Exception:
-            device_phone = None
-
-        # UFDR-style Conversations: <Chats><Conversation ...> ... <Message><Content>...</Message>
+        # XML path: UFDR-style Conversations are streamed with iterparse
+        # (<Chats><Conversation ...> ... <Message><Content>...</Message>) so memory
+        # stays at one conversation's worth of elements, not the whole report.
         # Accept Conversation as either attribute-based or child-element-based.
-        conv_nodes = xmlroot.findall(".//Chats/Conversation")
-        if conv_nodes:
-            for conv in conv_nodes:
-                # participant info
-                participant_id = conv.get("ParticipantID") or (conv.findtext("ParticipantID") if conv.find("ParticipantID") is not None else None)
-                participant_name = conv.get("ParticipantName") or (conv.findtext("ParticipantName") if conv.find("ParticipantName") is not None else None)
-                app = conv.get("App") or conv.findtext("App")
-                thread_id = f"{app}:{participant_id or participant_name}"
-
-                # iterate messages
-                for msg in conv.findall(".//Message"):
-                    ts = (msg.findtext("Timestamp") or msg.findtext("Date") or msg.findtext("Time") or "").strip()
-                    direction = (msg.findtext("Direction") or "").strip()
-                    # Content node may be <Content> or <Body> etc
-                    content = (msg.findtext("Content") or msg.findtext("Body") or msg.findtext("Text") or "").strip()
-                    if not content:
-                        # sometimes text is directly under message node as text
-                        content = (msg.text or "").strip()
-                    # Build sender/receiver heuristics
-                    if direction.lower().startswith("out"):
-                        sender = device_phone or "device"
-                        receiver = participant_id or participant_name
-                    else:
-                        sender = participant_id or participant_name
-                        receiver = device_phone or None
-
-                    results.append({
-                        "thread": thread_id,
-                        "sender": sender,
-                        "receiver": receiver,
-                        "timestamp": ts,
-                        "text": content,
-                        "raw": etree.tostring(msg, encoding="utf-8", pretty_print=True).decode("utf-8")
-                    })
+        device_phone = None
+        unresolved = []  # (record, outgoing) emitted before the device phone was seen
+        conv = conv_info = None
+        saw_conv = False
+        context = etree.iterparse(path, events=("start", "end"), tag=("DeviceInformation", "Conversation", "Message"), recover=True)
+        for event, elem in context:
+            tag = elem.tag
+            if tag == "Conversation":
+                if event == "start":
+                    parent = elem.getparent()
+                    if parent is not None and parent.tag == "Chats":
+                        conv, conv_info, saw_conv = elem, None, True
+                elif elem is conv:
+                    conv = None
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+            elif tag == "Message":
+                if event != "end" or conv is None:
+                    continue
+                if conv_info is None:
+                    # participant info (child elements preceding the first message are parsed by now)
+                    participant_id = conv.get("ParticipantID") or conv.findtext("ParticipantID")
+                    participant_name = conv.get("ParticipantName") or conv.findtext("ParticipantName")
+                    app = conv.get("App") or conv.findtext("App")
+                    conv_info = (f"{app}:{participant_id or participant_name}", participant_id or participant_name)
+                thread_id, participant = conv_info
+                msg = elem
+                ts = (msg.findtext("Timestamp") or msg.findtext("Date") or msg.findtext("Time") or "").strip()
+                direction = (msg.findtext("Direction") or "").strip()
+                # Content node may be <Content> or <Body> etc
+                content = (msg.findtext("Content") or msg.findtext("Body") or msg.findtext("Text") or "").strip()
+                if not content:
+                    # sometimes text is directly under message node as text
+                    content = (msg.text or "").strip()
+                # Build sender/receiver heuristics
+                outgoing = direction.lower().startswith("out")
+                if outgoing:
+                    sender = device_phone or "device"
+                    receiver = participant
+                else:
+                    sender = participant
+                    receiver = device_phone or None
+                record = {
+                    "thread": thread_id,
+                    "sender": sender,
+                    "receiver": receiver,
+                    "timestamp": ts,
+                    "text": content,
+                    "raw": _element_raw(msg)
+                }
+                results.append(record)
+                if device_phone is None:
+                    unresolved.append((record, outgoing))
+                msg.clear()
+                while msg.getprevious() is not None:
+                    del msg.getparent()[0]
+            elif event == "end" and device_phone is None:
+                # device identifier (phone number) from Metadata/DeviceInformation
+                device_phone = (elem.findtext("PhoneNumber") or "").strip() or None
+        if saw_conv:
+            if device_phone:
+                for record, outgoing in unresolved:
+                    record["sender" if outgoing else "receiver"] = device_phone
             return results
 
+        # no UFDR conversations: nothing was cleared, so the iterparse pass
+        # already holds the whole tree
+        xmlroot = context.root
+
         # Generic XML: try to find message-like nodes anywhere
-        nodes = xmlroot.findall(".//message") + xmlroot.findall(".//chatmessage") + xmlroot.findall(".//sms") + xmlroot.findall(".//conversation")
+        nodes = _XP_GEN_MESSAGE(xmlroot) + _XP_GEN_CHATMESSAGE(xmlroot) + _XP_GEN_SMS(xmlroot) + _XP_GEN_CONVERSATION(xmlroot)
         if nodes:
             for msg in nodes:
                 body = (msg.findtext("body") or msg.findtext("text") or (msg.text or "")).strip()
@@ -200,7 +441,7 @@ def parse_chat_file(path: str) -> List[Dict[str, Any]]:
                     "receiver": msg.get("to") or msg.findtext("to") or msg.findtext("recipient"),
                     "timestamp": msg.get("date") or msg.findtext("date") or msg.findtext("time"),
                     "text": body,
-                    "raw": etree.tostring(msg, encoding="utf-8", pretty_print=True).decode("utf-8")
+                    "raw": _element_raw(msg)
                 })
     except Exception:
         # tolerant: return whatever we parsed so far
@@ -215,10 +456,9 @@ def parse_contacts_file(path: str) -> List[Dict[str, Any]]:
     """
     results = []
     try:
-        text = Path(path).read_text(encoding="utf-8", errors="ignore")
-        stripped = text.lstrip()
-        if stripped.startswith("{") or stripped.startswith("["):
-            obj = json.loads(text)
+        kind, doc = _load_document(path)
+        if kind == "json":
+            obj = doc
             candidates = None
             if isinstance(obj, dict):
                 for candidate in ("contacts","items","data","phonebook"):
@@ -240,9 +480,9 @@ def parse_contacts_file(path: str) -> List[Dict[str, Any]]:
             return results
 
         # XML path
-        xmlroot = etree.fromstring(text.encode("utf-8"))
+        xmlroot = doc
         # UFDR-style Contacts
-        contact_nodes = xmlroot.findall(".//Contacts/Contact")
+        contact_nodes = _XP_CONTACT(xmlroot)
         for c in contact_nodes:
             name = (c.findtext("Name") or c.findtext("displayName") or c.findtext("FullName") or "").strip()
             phone = (c.findtext("PhoneNumber") or c.findtext("Phone") or "").strip()
@@ -252,11 +492,11 @@ def parse_contacts_file(path: str) -> List[Dict[str, Any]]:
             results.append({"name": name, "phones": phones, "emails": emails})
 
         # Generic XML contact nodes
-        xml_contacts = xmlroot.findall(".//contact") + xmlroot.findall(".//contactEntry")
+        xml_contacts = _XP_GEN_CONTACT(xmlroot) + _XP_GEN_CONTACT_ENTRY(xmlroot)
         for c in xml_contacts:
             name = c.findtext("displayName") or c.findtext("name")
-            phones = [p.text for p in c.findall(".//phone")] if c.findall(".//phone") else []
-            emails = [e.text for e in c.findall(".//email")] if c.findall(".//email") else []
+            phones = [p.text for p in _XP_GEN_PHONE(c)]
+            emails = [e.text for e in _XP_GEN_EMAIL(c)]
             results.append({"name": name, "phones": phones, "emails": emails})
     except Exception:
         pass
@@ -270,10 +510,9 @@ def parse_calls_file(path: str) -> List[Dict[str, Any]]:
     """
     results = []
     try:
-        text = Path(path).read_text(encoding="utf-8", errors="ignore")
-        stripped = text.lstrip()
-        if stripped.startswith("{") or stripped.startswith("["):
-            obj = json.loads(text)
+        kind, doc = _load_document(path)
+        if kind == "json":
+            obj = doc
             candidates = None
             if isinstance(obj, dict):
                 for candidate in ("calls","items","data","calllog"):
@@ -296,8 +535,8 @@ def parse_calls_file(path: str) -> List[Dict[str, Any]]:
             return results
 
         # XML path
-        xmlroot = etree.fromstring(text.encode("utf-8"))
-        call_nodes = xmlroot.findall(".//CallLogs/Call")
+        xmlroot = doc
+        call_nodes = _XP_CALL(xmlroot)
         for c in call_nodes:
             ts = (c.findtext("Timestamp") or c.findtext("Date") or "").strip()
             direction = (c.findtext("Direction") or "").strip()
@@ -311,7 +550,7 @@ def parse_calls_file(path: str) -> List[Dict[str, Any]]:
             })
 
         # generic <call> nodes
-        xml_calls = xmlroot.findall(".//call") + xmlroot.findall(".//callEntry")
+        xml_calls = _XP_GEN_CALL(xmlroot) + _XP_GEN_CALL_ENTRY(xmlroot)
         for c in xml_calls:
             results.append({
                 "number": c.findtext("number") or c.findtext("caller"),
@@ -322,3 +561,30 @@ def parse_calls_file(path: str) -> List[Dict[str, Any]]:
     except Exception:
         pass
     return results
+
+
+def _parse_all(parse_fn, paths: List[str], executor: Executor) -> List[Future]:
+    """
+    Fan parse_fn out over paths on a process pool (files parse independently
+    and the work is CPU-bound). Returns one future per path, in input order;
+    a pool that can no longer take work fails the futures instead of raising.
+    """
+    futures = []
+    for p in paths:
+        try:
+            futures.append(executor.submit(parse_fn, p))
+        except Exception as e:
+            f = Future()
+            f.set_exception(e)
+            futures.append(f)
+    return futures
+
+
+def parse_all_chats(paths: List[str], executor: Executor) -> List[Future]:
+    """parse_chat_file over paths on executor; one future (of messages) per path."""
+    return _parse_all(parse_chat_file, paths, executor)
+
+
+def parse_all_calls(paths: List[str], executor: Executor) -> List[Future]:
+    """parse_calls_file over paths on executor; one future (of call records) per path."""
+    return _parse_all(parse_calls_file, paths, executor)
@@ -1,9 +1,23 @@
 # indexer.py
 import sqlite3
 import os
-import json
+import platform
+import functools
+import itertools
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
+
+# Prefer orjson for serializing `raw`/`tags`; fall back to stdlib json.
+# Both paths produce utf-8 bytes, which SQLite stores as a BLOB as-is.
+try:
+    import orjson
+    json_dumps = orjson.dumps
+    ORJSON_AVAILABLE = True
+except Exception:
+    import json
+    def json_dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+    ORJSON_AVAILABLE = False
 
 # Try to import sentence-transformers; if unavailable, disable embeddings gracefully.
 EMBEDDINGS_AVAILABLE = True
@@ -13,6 +27,21 @@ except Exception:
     SentenceTransformer = None
     EMBEDDINGS_AVAILABLE = False
 
+# torch is only needed for the PyTorch embedding backend (GPU fp16, thread count)
+try:
+    import torch
+    torch.set_num_threads(os.cpu_count() or 1)
+except Exception:
+    torch = None
+
+# Optional numba JIT for the no-FAISS scoring loop (fused dot products, no temporaries)
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except Exception:
+    numba = None
+    NUMBA_AVAILABLE = False
+
 # Try to import faiss if available
 try:
     import faiss
@@ -25,8 +54,210 @@ except Exception:
 # If SentenceTransformer is not available, embeddings will be disabled.
 EMBED_MODEL_NAME = os.environ.get("EMBED_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
 EMBED_DIMS = 384
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "256"))
+
+
+def _default_onnx_file() -> str:
+    """The model repo's 8-bit ONNX export built for this CPU's instruction set."""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    flags = None  # unknown (no cpuinfo, e.g. macOS): assume a post-2013 x86 CPU
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = next((set(line.split(":", 1)[1].split()) for line in f if line.startswith("flags")), None)
+    except OSError:
+        pass
+    if flags is None:
+        return "onnx/model_quint8_avx2.onnx"
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512f" in flags:
+        return "onnx/model_qint8_avx512.onnx"
+    if "avx2" in flags:
+        return "onnx/model_quint8_avx2.onnx"
+    return "onnx/model.onnx"
+
+
+# Inference backend for the embedding model. "onnx" runs an int8-quantized ONNX
+# export through onnxruntime on the CPU (needs sentence-transformers>=3.2 +
+# optimum[onnxruntime]); anything else, or any load failure, uses the PyTorch
+# model, which runs in fp16 on CUDA. Defaults to ONNX only without a GPU.
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "torch" if torch is not None and torch.cuda.is_available() else "onnx")
+EMBED_ONNX_FILE = os.environ.get("EMBED_ONNX_FILE") or _default_onnx_file()
 
 DB_FILE = os.environ.get("UFDR_DB", "ufdr_data.db")
+# rows per executemany call when streaming messages into SQLite
+INSERT_CHUNK_ROWS = 10000
+
+# FAISS index tiers by corpus size: exact flat scan for small corpora, HNSW graph
+# for medium, IVF (nlist ~ sqrt(N)) for large. Vectors are L2-normalized, so
+# inner product == cosine in every tier.
+FAISS_FLAT_MAX = 10000
+FAISS_HNSW_MAX = 500000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 16
+# Store vectors as 8-bit scalars (4x smaller than float32). MiniLM-style
+# normalized embeddings lose negligible recall at 8 bits.
+EMBED_QUANTIZE = os.environ.get("EMBED_QUANTIZE", "1") not in ("", "0", "false", "False")
+FAISS_TRAIN_SAMPLE = 100000
+# New vectors are appended to the existing index; it is rebuilt (re-tiered and
+# retrained) once the corpus outgrows this factor of its size at the last build.
+INDEX_REBUILD_GROWTH = 2.0
+
+
+def _tune_faiss_index(index):
+    """Apply query-time parameters (not always persisted by write_index)."""
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    if hasattr(index, "nprobe"):
+        index.nprobe = IVF_NPROBE
+    return index
+
+
+def _build_faiss_index(embs: np.ndarray):
+    """Pick and populate a FAISS inner-product index sized for len(embs)."""
+    n, d = embs.shape
+    ip = faiss.METRIC_INNER_PRODUCT
+    if EMBED_QUANTIZE:
+        sq8 = faiss.ScalarQuantizer.QT_8bit
+        if n < FAISS_FLAT_MAX:
+            index = faiss.IndexScalarQuantizer(d, sq8, ip)
+        elif n < FAISS_HNSW_MAX:
+            index = faiss.IndexHNSWSQ(d, sq8, HNSW_M, ip)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        else:
+            index = faiss.IndexIVFScalarQuantizer(faiss.IndexFlatIP(d), d, int(np.sqrt(n)), sq8, ip)
+    else:
+        if n < FAISS_FLAT_MAX:
+            index = faiss.IndexFlatIP(d)
+        elif n < FAISS_HNSW_MAX:
+            index = faiss.IndexHNSWFlat(d, HNSW_M, ip)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        else:
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(d), d, int(np.sqrt(n)), ip)
+    if not index.is_trained:
+        # train quantizer ranges / IVF centroids on a sample
+        if n > FAISS_TRAIN_SAMPLE:
+            sample = embs[np.random.default_rng(0).choice(n, FAISS_TRAIN_SAMPLE, replace=False)]
+        else:
+            sample = embs
+        index.train(sample)
+    index.add(embs)
+    return _tune_faiss_index(index)
+
+
+def quantize_int8(embs: np.ndarray):
+    """
+    Symmetric per-row int8 quantization. Returns (int8 matrix, float32 row scales)
+    with embs ~= q * scales[:, None].
+    """
+    scales = np.abs(embs).max(axis=1).astype(np.float32) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.rint(embs / scales[:, None]).astype(np.int8)
+    return q, scales
+
+
+def _save_npy_atomic(path: str, arr: np.ndarray):
+    """np.save to a temp file, then rename over path (never truncates a mapped file)."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+if NUMBA_AVAILABLE:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _ip_scores_numba(vecs, q, out):
+        n, d = vecs.shape
+        for i in numba.prange(n):
+            s = 0.0
+            for j in range(d):
+                s += vecs[i, j] * q[j]
+            out[i] = s
+
+
+def topk_inner_product(vecs: np.ndarray, q: np.ndarray, top_k: int, scales: Optional[np.ndarray] = None, chunk_rows: int = 1024):
+    """
+    Indices of the top_k rows of vecs by inner product with the 1-D query q,
+    best first. int8 rows (the stored fallback vectors) are scored in place by
+    a parallel numba kernel when available. Otherwise (float16, or int8
+    without numba) rows are upcast chunk_rows at a time into one reused, cache-resident float32 buffer and
+    scored by BLAS straight into the output. Selection uses argpartition
+    (O(N)) before sorting only the top_k slice.
+    """
+    n = len(vecs)
+    if n == 0 or top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    q = np.ascontiguousarray(q, dtype=np.float32)
+    sims = np.empty(n, dtype=np.float32)
+    if NUMBA_AVAILABLE and vecs.dtype == np.int8:
+        _ip_scores_numba(np.asarray(vecs), q, sims)
+    else:
+        buf = np.empty((min(chunk_rows, n), vecs.shape[1]), dtype=np.float32)
+        for start in range(0, n, chunk_rows):
+            m = min(chunk_rows, n - start)
+            np.copyto(buf[:m], vecs[start:start + m], casting="unsafe")
+            np.dot(buf[:m], q, out=sims[start:start + m])
+    if scales is not None:
+        sims *= scales
+    if top_k < n:
+        idx = np.argpartition(sims, -top_k)[-top_k:]
+        return idx[np.argsort(-sims[idx])]
+    return np.argsort(-sims)
+
+
+@functools.lru_cache(maxsize=2)
+def _load_sentence_model(model_name: str):
+    """
+    Load the SentenceTransformer, preferring the ONNX backend when configured.
+    Cached per model name so multiple Indexer instances share one set of weights;
+    on CUDA the PyTorch model is cast to fp16.
+    """
+    if EMBED_BACKEND == "onnx":
+        try:
+            return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": EMBED_ONNX_FILE})
+        except Exception as e:
+            print("ONNX embedding backend unavailable, using PyTorch:", e)
+    model = SentenceTransformer(model_name)
+    if torch is not None and torch.cuda.is_available():
+        model = model.half().to("cuda")
+    return model
+
+
+def _embed_model_tag(model_name: str, model) -> str:
+    """
+    Identifies what produced a set of vectors: the model name plus the backend
+    actually loaded (an ONNX load can fall back to PyTorch) and its ONNX file.
+    """
+    backend = getattr(model, "backend", "torch")
+    if backend == "onnx":
+        return f"{model_name}:onnx:{EMBED_ONNX_FILE}"
+    return f"{model_name}:{backend}"
+
+
+def _sql_value(v):
+    """
+    Bindable form of a parsed field: scalars pass through, anything else
+    (e.g. a list of recipients) is stored as JSON text.
+    """
+    if v is None or isinstance(v, (str, int, float, bytes)):
+        return v
+    try:
+        return json_dumps(v).decode("utf-8")
+    except Exception:
+        return str(v)
+
+
+# per-row FTS sync; skipped while add_messages holds the 'bulk' meta flag and
+# indexes its whole batch with one statement instead
+_MESSAGES_AI_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages
+WHEN (SELECT value FROM meta WHERE key='bulk') IS NULL BEGIN
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+END;"""
+
 
 class Indexer:
     def __init__(self, db_path: str = DB_FILE, model_name: str = EMBED_MODEL_NAME):
@@ -34,14 +265,19 @@ class Indexer:
         self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
         self._init_db()
         self.model = None
+        self.embed_model_tag = None
         self.embedding_index = None
         self.ids = []
         self.embeddings_enabled = False
+        # memory-mapped vectors (+ int8 row scales) for the numpy search path
+        self._embs_mm = None
+        self._emb_scales = None
 
         if EMBEDDINGS_AVAILABLE and SentenceTransformer is not None:
             try:
                 # instantiate model lazily; catch failures and disable embeddings if they occur
-                self.model = SentenceTransformer(model_name)
+                self.model = _load_sentence_model(model_name)
+                self.embed_model_tag = _embed_model_tag(model_name, self.model)
                 # Attempt to read model dimension from model if possible
                 if hasattr(self.model, "get_sentence_embedding_dimension"):
                     EMBED_DIMS_ACTUAL = self.model.get_sentence_embedding_dimension()
@@ -61,6 +297,12 @@ class Indexer:
 
     def _init_db(self):
         cur = self.conn.cursor()
+        # bulk-ingest friendly settings: WAL journal, fewer fsyncs, in-memory temp
+        # structures and a 64 MiB page cache
+        cur.execute("PRAGMA journal_mode=WAL;")
+        cur.execute("PRAGMA synchronous=NORMAL;")
+        cur.execute("PRAGMA temp_store=MEMORY;")
+        cur.execute("PRAGMA cache_size=-65536;")
         cur.execute("""
         CREATE TABLE IF NOT EXISTS messages (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -69,10 +311,25 @@ class Indexer:
             receiver TEXT,
             timestamp TEXT,
             text TEXT,
-            raw TEXT
+            raw BLOB
         );
         """)
-        cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(text, content='messages', content_rowid='id');")
+        cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2');")
+        # keep the external-content FTS index in sync with messages
+        # (replacing an insert trigger created without the bulk-load guard)
+        old = cur.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name='messages_ai';").fetchone()
+        if old and "WHEN" not in old[0]:
+            cur.execute("DROP TRIGGER messages_ai;")
+        cur.execute(_MESSAGES_AI_TRIGGER)
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END;""")
+        cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+        END;""")
         cur.execute("""
         CREATE TABLE IF NOT EXISTS media (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -89,34 +346,52 @@ class Indexer:
         )""")
         self.conn.commit()
 
-    def add_messages(self, messages: List[Dict[str, Any]]):
+    def add_messages(self, messages: Iterable[Dict[str, Any]]) -> int:
         """
-        Insert a list of messages into the DB and update FTS index.
+        Insert messages (any iterable, e.g. a parser generator) into the DB and
+        index their text in FTS. Rows are streamed in INSERT_CHUNK_ROWS chunks,
+        so a generator is never materialized. Returns the number inserted.
         """
-        if not messages:
-            return
-        cur = self.conn.cursor()
-        for m in messages:
-            cur.execute(
-                "INSERT INTO messages (thread,sender,receiver,timestamp,text,raw) VALUES (?,?,?,?,?,?);",
-                (m.get("thread"), m.get("sender"), m.get("receiver"), str(m.get("timestamp")), m.get("text"), json.dumps(m.get("raw")))
-            )
-            rowid = cur.lastrowid
-            cur.execute("INSERT INTO messages_fts(rowid, text) VALUES (?, ?);", (rowid, m.get("text") or ""))
-        self.conn.commit()
+        rows = (
+            (_sql_value(m.get("thread")), _sql_value(m.get("sender")), _sql_value(m.get("receiver")),
+             str(m.get("timestamp")), _sql_value(m.get("text")), json_dumps(m.get("raw")))
+            for m in messages
+        )
+        chunk = list(itertools.islice(rows, INSERT_CHUNK_ROWS))
+        if not chunk:
+            return 0
+        inserted = 0
+        # one transaction for the whole batch (rolled back on error, flag
+        # included). The 'bulk' flag mutes the per-row FTS trigger and the new
+        # id range is indexed with a single INSERT ... SELECT instead.
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('bulk', '1');")
+            start = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages;").fetchone()[0]
+            while chunk:
+                self.conn.executemany("INSERT INTO messages (thread,sender,receiver,timestamp,text,raw) VALUES (?,?,?,?,?,?);", chunk)
+                inserted += len(chunk)
+                chunk = list(itertools.islice(rows, INSERT_CHUNK_ROWS))
+            self.conn.execute("INSERT INTO messages_fts(rowid, text) SELECT id, text FROM messages WHERE id > ?;", (start,))
+            self.conn.execute("DELETE FROM meta WHERE key='bulk';")
+        return inserted
 
     def add_media(self, media_items: List[Dict[str, Any]]):
         if not media_items:
             return
-        cur = self.conn.cursor()
-        for m in media_items:
-            cur.execute("INSERT INTO media (path,filename,mtype,timestamp,tags) VALUES (?,?,?,?,?);",
-                        (m.get("path"), m.get("filename"), m.get("mtype"), m.get("timestamp"), json.dumps(m.get("tags") or [])))
-        self.conn.commit()
+        rows = [
+            (m.get("path"), m.get("filename"), m.get("mtype"), m.get("timestamp"), json_dumps(m.get("tags") or []))
+            for m in media_items
+        ]
+        with self.conn:
+            self.conn.executemany("INSERT INTO media (path,filename,mtype,timestamp,tags) VALUES (?,?,?,?,?);", rows)
 
     def compute_and_store_embeddings(self, limit: Optional[int] = None):
         """
         Compute embeddings for messages and store them as .npy; build FAISS index if available.
+        Only messages added since the last call are encoded and appended to the
+        index; the index is rebuilt when the corpus has grown more than
+        INDEX_REBUILD_GROWTH times since it was last built. Passing limit
+        recomputes the first `limit` messages from scratch.
         If embeddings are disabled, do nothing.
         """
         if not self.embeddings_enabled or self.model is None:
@@ -124,62 +399,172 @@ class Indexer:
             return
 
         cur = self.conn.cursor()
-        q = "SELECT id, text FROM messages"
-        if limit:
-            q += f" LIMIT {limit}"
-        rows = cur.execute(q).fetchall()
+        old_embs = self._load_stored_vectors() if not limit else None
+        if old_embs is not None:
+            rows = cur.execute("SELECT id, text FROM messages WHERE id > ? ORDER BY id", (int(self.ids[-1]),)).fetchall()
+        else:
+            q = "SELECT id, text FROM messages"
+            if limit:
+                q += f" LIMIT {limit}"
+            rows = cur.execute(q).fetchall()
         texts = [r[1] or "" for r in rows]
         ids = [r[0] for r in rows]
         if not texts:
             return
-        # compute embeddings
-        embs = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        # compute embeddings; L2-normalization is fused into the model's encode
+        # pipeline so inner product == cosine without a separate numpy pass
+        new_embs = self.model.encode(
+            texts,
+            batch_size=EMBED_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        ).astype(np.float32, copy=False)
+        new_embs = np.ascontiguousarray(new_embs)
+        if old_embs is not None:
+            embs = np.concatenate([old_embs, new_embs])
+            ids = list(self.ids) + ids
+        else:
+            embs = new_embs
         # persist embeddings and ids
         np.save("embeddings_ids.npy", np.array(ids))
         np.save("embeddings_vectors.npy", embs)
+        self._set_meta("embed_model", self.embed_model_tag)
         self.ids = ids
         # build FAISS index if available
         if FAISS_AVAILABLE:
             try:
-                index = faiss.IndexFlatIP(embs.shape[1])
-                faiss.normalize_L2(embs)
-                index.add(embs)
+                built = int(self._get_meta("index_built_count") or 0)
+                if old_embs is not None and self.embedding_index is not None and len(embs) <= INDEX_REBUILD_GROWTH * built:
+                    index = self.embedding_index
+                    index.add(new_embs)
+                else:
+                    index = _build_faiss_index(embs)
+                    self._set_meta("index_built_count", len(embs))
                 faiss.write_index(index, "embeddings.faiss")
                 self.embedding_index = index
             except Exception as e:
                 print("FAISS index build failed, will fallback to numpy-based search:", e)
                 self.embedding_index = None
+                self._save_fallback_vectors(embs)
         else:
-            # normalize and save normalized vectors for brute-force
-            norms = np.linalg.norm(embs, axis=1, keepdims=True)
-            norms[norms == 0] = 1.0
-            embs = embs / norms
-            np.save("embeddings_vectors_normalized.npy", embs)
+            # vectors are already normalized; save them for brute-force search
+            self._save_fallback_vectors(embs)
             self.embedding_index = None
 
+    def _load_stored_vectors(self) -> Optional[np.ndarray]:
+        """
+        Previously computed vectors, if they were made by the current model and
+        still line up with the messages table (every stored id present and
+        nothing older missing); else None.
+        """
+        if not self.ids or not os.path.exists("embeddings_vectors.npy"):
+            return None
+        if self._get_meta("embed_model") != self.embed_model_tag:
+            return None
+        try:
+            embs = np.load("embeddings_vectors.npy")
+            n = self.conn.execute("SELECT COUNT(*) FROM messages WHERE id <= ?", (int(self.ids[-1]),)).fetchone()[0]
+        except Exception:
+            return None
+        if len(embs) != len(self.ids) or n != len(self.ids):
+            return None
+        return embs
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        r = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return r[0] if r else None
+
+    def _set_meta(self, key: str, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _save_fallback_vectors(self, embs: np.ndarray):
+        """
+        Persist normalized vectors for the numpy (no-FAISS) search path:
+        int8 + per-row scales when EMBED_QUANTIZE, else float16 (half the
+        pages of float32; rows are upcast blockwise at query time).
+        Files are replaced atomically so live memory maps of the old files stay valid.
+        """
+        if EMBED_QUANTIZE:
+            q, scales = quantize_int8(embs)
+            _save_npy_atomic("embeddings_vectors_int8.npy", q)
+            _save_npy_atomic("embeddings_scales.npy", scales)
+        else:
+            _save_npy_atomic("embeddings_vectors_f16.npy", embs.astype(np.float16))
+        self._embs_mm = None
+        self._emb_scales = None
+        self._load_fallback_vectors()
+
+    def _fallback_paths(self):
+        if EMBED_QUANTIZE:
+            return ["embeddings_vectors_int8.npy", "embeddings_scales.npy"]
+        return ["embeddings_vectors_f16.npy"]
+
+    def _load_fallback_vectors(self):
+        """
+        Return (vectors, row_scales or None) for numpy search, or (None, None).
+        Vectors are memory-mapped once and cached; the OS page cache keeps hot
+        pages resident across queries.
+        """
+        if self._embs_mm is None:
+            paths = self._fallback_paths()
+            if not all(os.path.exists(p) for p in paths):
+                return None, None
+            self._embs_mm = np.load(paths[0], mmap_mode="r")
+            self._emb_scales = np.load(paths[1]) if len(paths) > 1 else None
+        return self._embs_mm, self._emb_scales
+
     def _load_embeddings_index_if_exists(self):
         """
         Load previous embeddings if present; set up embedding_index if FAISS index exists.
+        Vectors made by a different model are skipped; the next
+        compute_and_store_embeddings recomputes them all.
         """
+        stored_model = self._get_meta("embed_model")
+        if stored_model is not None and stored_model != self.embed_model_tag:
+            print(f"Stored embeddings were made by {stored_model}, not {self.embed_model_tag}; ignoring them")
+            return
         if os.path.exists("embeddings_ids.npy") and os.path.exists("embeddings_vectors.npy"):
             try:
                 self.ids = np.load("embeddings_ids.npy").tolist()
-                embs = np.load("embeddings_vectors.npy")
                 if FAISS_AVAILABLE and os.path.exists("embeddings.faiss"):
-                    self.embedding_index = faiss.read_index("embeddings.faiss")
+                    self.embedding_index = _tune_faiss_index(faiss.read_index("embeddings.faiss"))
                 else:
-                    norms = np.linalg.norm(embs, axis=1, keepdims=True)
-                    norms[norms == 0] = 1.0
-                    normalized = embs / norms
-                    np.save("embeddings_vectors_normalized.npy", normalized)
+                    # (re)build the search vectors only if missing or older than the source
+                    src_mtime = os.path.getmtime("embeddings_vectors.npy")
+                    paths = self._fallback_paths()
+                    if not all(os.path.exists(p) and os.path.getmtime(p) >= src_mtime for p in paths):
+                        # memory-map the vectors: only the pages actually read are loaded
+                        embs = np.load("embeddings_vectors.npy", mmap_mode="r")
+                        norms = np.linalg.norm(embs, axis=1, keepdims=True)
+                        norms[norms == 0] = 1.0
+                        normalized = (embs / norms).astype(np.float32, copy=False)
+                        self._save_fallback_vectors(normalized)
+                    else:
+                        self._load_fallback_vectors()
                     self.embedding_index = None
             except Exception as e:
                 print("Failed to load existing embeddings:", e)
                 self.embedding_index = None
 
-    def semantic_search(self, query: str, top_k: int = 5):
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """
+        L2-normalized float32 embedding (1-D) of a query string, or None if
+        embeddings are disabled.
+        """
+        if not self.embeddings_enabled or self.model is None:
+            return None
+        try:
+            return self.model.encode([query], convert_to_numpy=True, normalize_embeddings=True).astype(np.float32, copy=False)[0]
+        except Exception as e:
+            print("embed_query error:", e)
+            return None
+
+    def semantic_search(self, query: str, top_k: int = 5, q_emb: Optional[np.ndarray] = None):
         """
         Return top_k messages by semantic similarity to query.
+        Pass q_emb (from embed_query) to reuse an already computed query embedding.
         If embeddings are disabled or not present, return [].
         """
         if not self.embeddings_enabled:
@@ -188,49 +573,66 @@ class Indexer:
             return []
 
         try:
-            q_emb = self.model.encode([query], convert_to_numpy=True)
-            q_emb = q_emb / (np.linalg.norm(q_emb, axis=1, keepdims=True) + 1e-12)
+            if q_emb is None:
+                q_emb = self.embed_query(query)
+                if q_emb is None:
+                    return []
+            q_emb = q_emb.reshape(1, -1)
             if FAISS_AVAILABLE and self.embedding_index is not None:
                 D, I = self.embedding_index.search(q_emb, top_k)
-                results = []
-                for idx in I[0]:
-                    if idx < len(self.ids):
-                        msg_id = int(self.ids[idx])
-                        r = self._fetch_message_by_id(msg_id)
-                        if r: results.append(r)
-                return results
+                # FAISS pads with -1 when fewer than top_k results exist
+                msg_ids = [int(self.ids[idx]) for idx in I[0] if 0 <= idx < len(self.ids)]
+                return self._fetch_messages_by_ids(msg_ids)
             else:
-                if os.path.exists("embeddings_vectors_normalized.npy"):
-                    embs = np.load("embeddings_vectors_normalized.npy")
-                    sims = (embs @ q_emb.T).squeeze()
-                    topk_idx = np.argsort(-sims)[:top_k]
-                    results = []
-                    for i in topk_idx:
-                        msg_id = int(self.ids[i])
-                        r = self._fetch_message_by_id(msg_id)
-                        if r: results.append(r)
-                    return results
+                embs, scales = self._load_fallback_vectors()
+                if embs is not None:
+                    topk_idx = topk_inner_product(embs, q_emb[0], top_k, scales)
+                    return self._fetch_messages_by_ids([int(self.ids[i]) for i in topk_idx])
         except Exception as e:
             print("semantic_search error:", e)
             return []
         return []
 
-    def _fetch_message_by_id(self, mid: int):
-        cur = self.conn.cursor()
-        r = cur.execute("SELECT id,thread,sender,receiver,timestamp,text FROM messages WHERE id=?", (mid,)).fetchone()
-        if not r:
-            return None
-        return {"id": r[0], "thread": r[1], "sender": r[2], "receiver": r[3], "timestamp": r[4], "text": r[5]}
+    def _fetch_messages_by_ids(self, ids: List[int]):
+        """
+        Fetch several messages in one query, returned in the order of ids
+        (missing ids are skipped).
+        """
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        rows = self.conn.execute(
+            f"SELECT id,thread,sender,receiver,timestamp,text FROM messages WHERE id IN ({placeholders})", ids
+        ).fetchall()
+        by_id = {r[0]: {"id": r[0], "thread": r[1], "sender": r[2], "receiver": r[3], "timestamp": r[4], "text": r[5]} for r in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def count_messages(self, cap: Optional[int] = None) -> int:
+        """Number of stored messages; with cap, stop counting at cap rows."""
+        if cap is None:
+            return self.conn.execute("SELECT COUNT(*) FROM messages;").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM (SELECT 1 FROM messages LIMIT ?);", (cap,)).fetchone()[0]
 
-    def fts_search(self, phrase: str, limit: int = 50):
+    def fts_search(self, phrase: str, limit: int = 50, raise_errors: bool = False):
         """
-        Full-text search via SQLite FTS5.
+        Full-text search via SQLite FTS5, best bm25 match first.
+        The MATCH runs alone in a CTE so the planner always drives it from the
+        FTS index and only the top `limit` rowids are joined back to messages.
+        A phrase that is not valid FTS5 syntax returns [] unless raise_errors.
         """
         cur = self.conn.cursor()
-        q = "SELECT messages.id, messages.thread, messages.sender, messages.receiver, messages.timestamp, messages.text FROM messages JOIN messages_fts ON messages_fts.rowid=messages.id WHERE messages_fts MATCH ? LIMIT ?;"
+        q = """
+        WITH m AS (
+            SELECT rowid, bm25(messages_fts) AS score FROM messages_fts
+            WHERE messages_fts MATCH ? ORDER BY score LIMIT ?
+        )
+        SELECT messages.id, messages.thread, messages.sender, messages.receiver, messages.timestamp, messages.text
+        FROM m JOIN messages ON messages.id = m.rowid ORDER BY m.score;"""
         try:
             rows = cur.execute(q, (phrase, limit)).fetchall()
             return [{"id": r[0], "thread": r[1], "sender": r[2], "receiver": r[3], "timestamp": r[4], "text": r[5]} for r in rows]
         except Exception:
+            if raise_errors:
+                raise
             # If FTS query fails, return empty list rather than crashing
             return []
@@ -3,45 +3,364 @@ import uvicorn
 import os
 import re
 import shutil
+import uuid
+import asyncio
+import hashlib
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from fastapi import FastAPI, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from pathlib import Path
-from extractor import extract_ufdr, parse_chat_file, parse_calls_file, parse_contacts_file
+from extractor import extract_ufdr, parse_all_chats, parse_all_calls
 from indexer import Indexer
+from query_cache import SemanticCache
+from summary_service import SummaryService
 # transformers pipeline optional
 try:
-    from transformers import pipeline
+    import torch
+    from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer
 except Exception:
     pipeline = None
+# orjson renders responses several times faster than stdlib json; optional
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    orjson = None
+    ORJSON_AVAILABLE = False
+# Optional DFA regex engines for the crypto scan: Hyperscan, then RE2, else re
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except Exception:
+    hyperscan = None
+    HYPERSCAN_AVAILABLE = False
+try:
+    import re2
+    RE2_AVAILABLE = True
+except Exception:
+    re2 = None
+    RE2_AVAILABLE = False
 
 UPLOAD_DIR = "uploads"
 EXTRACT_DIR = "extracted"
 for d in (UPLOAD_DIR, EXTRACT_DIR):
     os.makedirs(d, exist_ok=True)
 
-app = FastAPI(title="UFDR Investigator Backend (backend-only)")
+# Max accepted upload size in bytes (0 = unlimited). Uploads are streamed to disk
+# in UPLOAD_CHUNK_SIZE pieces, so memory use does not grow with the file size.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", "0"))
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# File parsing is CPU-bound Python; spread it across processes. Workers are
+# forked from a single-threaded forkserver (with the extractor preloaded), not
+# from this process, whose threadpool and torch threads a fork would copy
+# mid-operation.
+def new_parse_pool():
+    ctx = None
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["__main__", "extractor"])
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=ctx)
+
+
+parse_pool = new_parse_pool()
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson (numpy values allowed) when it is installed."""
+
+    def render(self, content) -> bytes:
+        if not ORJSON_AVAILABLE:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    scan_previous_uploads()
+    cleanup = asyncio.get_running_loop().create_task(cleanup_stale_extracts())
+    yield
+    cleanup.cancel()
+
+
+app = FastAPI(title="UFDR Investigator Backend (backend-only)", default_response_class=FastJSONResponse, lifespan=lifespan)
+app.state.max_upload = MAX_UPLOAD_BYTES
 
 indexer = Indexer()
 
 # Summarizer model can be disabled by setting env var SUMMARIZER_MODEL='' or not installing transformers.
 SUMMARIZER_MODEL = os.environ.get("SUMMARIZER_MODEL", "google/flan-t5-small")
+# Summarizer weight format: "bfloat16" (default) halves the bytes each matmul
+# moves; "int8" applies dynamic int8 quantization to the Linear layers;
+# "float32" keeps the checkpoint as-is.
+SUMMARIZER_DTYPE = os.environ.get("SUMMARIZER_DTYPE", "bfloat16")
+
+
+def load_summarizer(name: str):
+    """Build the text2text pipeline with weights converted per SUMMARIZER_DTYPE."""
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    if SUMMARIZER_DTYPE == "int8":
+        model = AutoModelForSeq2SeqLM.from_pretrained(name)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(name, torch_dtype=getattr(torch, SUMMARIZER_DTYPE))
+    model.eval()
+    return pipeline("text2text-generation", model=model, tokenizer=tokenizer, truncation=True)
+
+
 summarizer = None
 if SUMMARIZER_MODEL and pipeline is not None:
     try:
-        summarizer = pipeline("text2text-generation", model=SUMMARIZER_MODEL, truncation=True)
+        summarizer = load_summarizer(SUMMARIZER_MODEL)
     except Exception as e:
         print("Summarizer pipeline init failed; summaries will be disabled:", e)
         summarizer = None
 
-CRYPTO_PATTERNS = [
-    re.compile(r"\b[13][A-HJ-NP-Za-km-z1-9]{25,34}\b"),  # BTC
-    re.compile(r"\b0x[a-fA-F0-9]{40}\b"),                # ETH
-]
+# Generation runs on a background thread, micro-batching concurrent requests
+SUMMARY_BATCH_SIZE = int(os.environ.get("SUMMARY_BATCH_SIZE", "8"))
+SUMMARY_BATCH_WINDOW = float(os.environ.get("SUMMARY_BATCH_WINDOW", "0.02"))
+summary_service = SummaryService(summarizer, SUMMARY_BATCH_SIZE, SUMMARY_BATCH_WINDOW) if summarizer else None
+
+# flan-t5 reads at most ~512 tokens (~2000 chars); longer prompts are cut here
+# so the tokenizer never processes text the pipeline would truncate anyway
+MAX_PROMPT_CHARS = int(os.environ.get("MAX_PROMPT_CHARS", "1800"))
+
+
+def join_prompt(parts, sep: str) -> str:
+    """sep.join(parts), stopping once MAX_PROMPT_CHARS is reached."""
+    out, n = [], 0
+    for p in parts:
+        if n >= MAX_PROMPT_CHARS:
+            break
+        out.append(p)
+        n += len(p) + len(sep)
+    return sep.join(out)[:MAX_PROMPT_CHARS]
+
+# Content-addressed LRU of summarizer outputs: identical (prompt, max_length)
+# pairs skip the model forward pass entirely.
+SUMMARY_CACHE_SIZE = int(os.environ.get("SUMMARY_CACHE_SIZE", "512"))
+_summary_cache = OrderedDict()
+
+
+async def summarize(prompt: str, max_length: int) -> str:
+    """Run the summarizer on prompt, memoized on blake2b(max_length, prompt)."""
+    key = hashlib.blake2b(f"{max_length}\0{prompt}".encode("utf-8"), digest_size=16).digest()
+    cached = _summary_cache.get(key)
+    if cached is not None:
+        _summary_cache.move_to_end(key)
+        return cached
+    text = await summary_service.submit(prompt, max_length)
+    _summary_cache[key] = text
+    if len(_summary_cache) > SUMMARY_CACHE_SIZE:
+        _summary_cache.popitem(last=False)
+    return text
+
+# Semantic cache of /query responses: a new query whose embedding has cosine
+# >= QUERY_CACHE_THRESHOLD with a recent one reuses its response. One cache per
+# query mode so a near-duplicate never crosses the crypto/search branches.
+# The crypto scan does not depend on the query text, so its single response
+# is cached under CRYPTO_CACHE_KEY without embedding the query.
+QUERY_CACHE_THRESHOLD = float(os.environ.get("QUERY_CACHE_THRESHOLD", "0.95"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "300"))
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+CRYPTO_CACHE_KEY = np.ones(1, dtype=np.float32)
+query_caches = {
+    "crypto": SemanticCache(QUERY_CACHE_THRESHOLD, QUERY_CACHE_TTL, 1),
+    "search": SemanticCache(QUERY_CACHE_THRESHOLD, QUERY_CACHE_TTL, QUERY_CACHE_SIZE),
+}
+
+# BTC and ETH addresses in one alternation so each text is scanned once
+CRYPTO_EXPRESSIONS = (
+    r"\b[13][A-HJ-NP-Za-km-z1-9]{25,34}\b",
+    r"\b0x[a-fA-F0-9]{40}\b",
+)
+CRYPTO_PATTERN = re.compile(
+    rf"(?P<btc>{CRYPTO_EXPRESSIONS[0]})"
+    rf"|(?P<eth>{CRYPTO_EXPRESSIONS[1]})"
+)
+# Bulk prefilter engine. Hyperscan/RE2 treat \b as ASCII-only, which accepts a
+# superset of what CRYPTO_PATTERN matches, so matches are still extracted with
+# `re` on the (few) candidate rows.
+_crypto_re = re2.compile(CRYPTO_PATTERN.pattern) if RE2_AVAILABLE else CRYPTO_PATTERN
+_crypto_db = None
+if HYPERSCAN_AVAILABLE:
+    try:
+        _crypto_db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        _crypto_db.compile(
+            expressions=[e.encode() for e in CRYPTO_EXPRESSIONS],
+            ids=list(range(len(CRYPTO_EXPRESSIONS))),
+            flags=[0] * len(CRYPTO_EXPRESSIONS),
+        )
+    except Exception as e:
+        print("Hyperscan compile failed; using regex prefilter:", e)
+        _crypto_db = None
+
+
+def has_crypto(txt) -> bool:
+    """SQLite predicate: could txt contain a crypto address?"""
+    if not txt:
+        return False
+    if _crypto_db is not None:
+        try:
+            # a truthy handler return stops the scan at the first match
+            _crypto_db.scan(txt.encode("utf-8"), match_event_handler=lambda *a: True)
+        except hyperscan.ScanTerminated:
+            return True
+        return False
+    return _crypto_re.search(txt) is not None
+
+
+indexer.conn.create_function("HAS_CRYPTO", 1, has_crypto, deterministic=True)
+
+# Forwarded/quoted messages repeat verbatim; remember their matches across requests
+CRYPTO_MATCH_CACHE_SIZE = 4096
+_crypto_match_cache = OrderedDict()
+
+
+def crypto_matches(txt: str):
+    """CRYPTO_PATTERN matches in txt (in order), memoized per exact text."""
+    found = _crypto_match_cache.get(txt)
+    if found is not None:
+        _crypto_match_cache.move_to_end(txt)
+        return found
+    found = [m.group(0) for m in CRYPTO_PATTERN.finditer(txt)]
+    _crypto_match_cache[txt] = found
+    if len(_crypto_match_cache) > CRYPTO_MATCH_CACHE_SIZE:
+        _crypto_match_cache.popitem(last=False)
+    return found
+
+
+# Below SEM_MIN indexed messages a query whose FTS search ran and matched nothing
+# returns empty without being embedded. 0 (default) disables the short-circuit.
+SEM_MIN = int(os.environ.get("SEM_MIN", "0"))
+
+# Reciprocal rank fusion constant: a hit at rank r in a list contributes 1/(RRF_K + r)
+RRF_K = 60
+
+
+def rrf_merge(ranked_lists, limit: int = 25):
+    """
+    Fuse ranked hit lists (dicts with an "id") by reciprocal rank fusion and
+    return the top `limit` unique hits, best first. Ties keep first-seen order.
+    """
+    hits, scores = {}, {}
+    for ranked in ranked_lists:
+        for rank, h in enumerate(h for h in ranked or [] if h):
+            hits.setdefault(h["id"], h)
+            scores[h["id"]] = scores.get(h["id"], 0.0) + 1.0 / (RRF_K + rank + 1)
+    return [hits[i] for i in sorted(scores, key=scores.__getitem__, reverse=True)[:limit]]
+
+
+def save_upload(src, dest_path: str, max_bytes: int = 0) -> int:
+    """
+    Copy an upload's file object to dest_path in fixed-size chunks.
+    Returns bytes written; raises ValueError (and removes the partial file)
+    if max_bytes is set and exceeded.
+    """
+    written = 0
+    try:
+        with open(dest_path, "wb") as f:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if max_bytes and written > max_bytes:
+                    raise ValueError(f"upload exceeds {max_bytes} bytes")
+                f.write(chunk)
+    except ValueError:
+        os.remove(dest_path)
+        raise
+    return written
+
+
+# Each upload is saved as UPLOAD_DIR/<id>/<filename> and extracted into
+# EXTRACT_DIR/<id> (id = a full uuid4 hex), so concurrent uploads of one
+# filename never share (or delete) a file or tree. latest_extracts maps a
+# filename to its newest extract tree; superseded and failed trees are queued
+# in stale_extracts and removed by a periodic background task. Saved uploads
+# are never removed. Both are rebuilt from disk at startup.
+EXTRACT_CLEANUP_INTERVAL = float(os.environ.get("EXTRACT_CLEANUP_INTERVAL", "60"))
+UPLOAD_ID_RE = re.compile(r"[0-9a-f]{32}")
+latest_extracts = {}
+stale_extracts = set()
+
+
+def scan_previous_uploads():
+    """
+    Rebuild latest_extracts/stale_extracts from the <id> directories this
+    code created: per filename, the most recent upload's extract tree is kept
+    and older ones are queued for removal. Anything else is left alone.
+    """
+    newest = {}
+    for entry in os.scandir(UPLOAD_DIR):
+        extract_path = os.path.join(EXTRACT_DIR, entry.name)
+        if not (entry.is_dir() and UPLOAD_ID_RE.fullmatch(entry.name) and os.path.isdir(extract_path)):
+            continue
+        names = os.listdir(entry.path)
+        if len(names) != 1:
+            continue
+        mtime = entry.stat().st_mtime
+        if names[0] in newest and newest[names[0]][1] >= mtime:
+            stale_extracts.add(extract_path)
+            continue
+        if names[0] in newest:
+            stale_extracts.add(newest[names[0]][0])
+        newest[names[0]] = (extract_path, mtime)
+    latest_extracts.update({name: path for name, (path, _) in newest.items()})
+
+
+async def cleanup_stale_extracts():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(EXTRACT_CLEANUP_INTERVAL)
+        while stale_extracts:
+            await loop.run_in_executor(None, shutil.rmtree, stale_extracts.pop(), True)
+
+
+def _replace_parse_pool(broken_pool):
+    """Swap in a fresh parse_pool unless another request already did."""
+    global parse_pool
+    if parse_pool is broken_pool:
+        print("parse pool broke; restarting it")
+        broken_pool.shutdown(wait=False)
+        parse_pool = new_parse_pool()
+
+
+async def run_parses(jobs):
+    """
+    Run (parse_all_*, paths) jobs on parse_pool and return, per job, the
+    results (or exceptions) in path order. A crashed worker breaks the whole
+    pool: it is replaced, and each file it took down is retried on its own so
+    a file that kills its worker cannot take the others down again.
+    """
+    async def wait(futures):
+        return await asyncio.gather(*map(asyncio.wrap_future, futures), return_exceptions=True)
+
+    pool = parse_pool
+    # submit every job before awaiting any, so they share the pool
+    pending = [parse_all(paths, pool) for parse_all, paths in jobs]
+    outs = [await wait(futures) for futures in pending]
+    for (parse_all, paths), results in zip(jobs, outs):
+        for i, res in enumerate(results):
+            if not isinstance(res, BrokenProcessPool):
+                continue
+            _replace_parse_pool(pool)
+            pool = parse_pool
+            results[i] = (await wait(parse_all([paths[i]], pool)))[0]
+    if any(isinstance(res, BrokenProcessPool) for results in outs for res in results):
+        _replace_parse_pool(pool)
+    return outs
 
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "query_cache": {mode: c.stats() for mode, c in query_caches.items()}}
 
 
 @app.post("/upload-ufdr")
@@ -50,17 +369,24 @@ async def upload_ufdr(file: UploadFile = File(...)):
     Upload .ufdr/.zip OR standalone report.xml.
     If .xml, parsers will inspect it directly for messages/calls/contacts.
     """
-    save_path = os.path.join(UPLOAD_DIR, file.filename)
-    with open(save_path, "wb") as f:
-        f.write(await file.read())
+    max_upload = app.state.max_upload
+    if max_upload and file.size is not None and file.size > max_upload:
+        return FastJSONResponse({"status": "error", "reason": f"File too large (limit {max_upload} bytes)"}, status_code=413)
+    filename = Path(file.filename).name
+    suffix = Path(filename).suffix.lower()
+    upload_id = uuid.uuid4().hex
+    os.makedirs(os.path.join(UPLOAD_DIR, upload_id))
+    save_path = os.path.join(UPLOAD_DIR, upload_id, filename)
+    # stream to disk off the event loop instead of buffering the whole upload
+    try:
+        await run_in_threadpool(save_upload, file.file, save_path, max_upload)
+    except ValueError:
+        os.rmdir(os.path.dirname(save_path))
+        return FastJSONResponse({"status": "error", "reason": f"File too large (limit {max_upload} bytes)"}, status_code=413)
 
-    base_stem = Path(file.filename).stem
-    extract_path = os.path.join(EXTRACT_DIR, base_stem)
-    if os.path.exists(extract_path):
-        shutil.rmtree(extract_path)
-    os.makedirs(extract_path, exist_ok=True)
+    extract_path = os.path.join(EXTRACT_DIR, upload_id)
+    os.makedirs(extract_path)
 
-    suffix = Path(file.filename).suffix.lower()
     manifest = None
     try:
         if suffix in (".ufdr", ".zip"):
@@ -85,9 +411,11 @@ async def upload_ufdr(file: UploadFile = File(...)):
                 manifest = extract_ufdr(save_path, extract_path)
                 extract_method = "fallback_unzip"
             except Exception as e:
-                return JSONResponse({"status": "error", "reason": f"Unsupported file type: {suffix}. unzip failed: {e}"}, status_code=400)
+                stale_extracts.add(extract_path)
+                return FastJSONResponse({"status": "error", "reason": f"Unsupported file type: {suffix}. unzip failed: {e}"}, status_code=400)
     except Exception as e:
-        return JSONResponse({"status": "error", "reason": f"Extraction failed: {e}"}, status_code=500)
+        stale_extracts.add(extract_path)
+        return FastJSONResponse({"status": "error", "reason": f"Extraction failed: {e}"}, status_code=500)
 
     total_messages = 0
 
@@ -100,47 +428,49 @@ async def upload_ufdr(file: UploadFile = File(...)):
     else:
         chat_keys = manifest.get("chats", [])
 
-    for chatfile in chat_keys:
-        try:
-            msgs = parse_chat_file(chatfile)
-            if msgs:
-                indexer.add_messages(msgs)
-                total_messages += len(msgs)
-        except Exception as e:
-            print(f"parse_chat_file failed for {chatfile}: {e}")
+    # parse every file in the process pool, then insert in one batch
+    # (contacts are not stored yet, so they are not parsed)
+    call_keys = manifest.get("calls", [])
+    chat_results, call_results = await run_parses([(parse_all_chats, chat_keys), (parse_all_calls, call_keys)])
+    previous = latest_extracts.get(filename)
+    latest_extracts[filename] = extract_path
+    if previous:
+        stale_extracts.add(previous)
 
-    for cfile in manifest.get("contacts", []):
-        try:
-            contacts = parse_contacts_file(cfile)
-            # optional: persist contacts in DB (extension)
-        except Exception as e:
-            print(f"parse_contacts_file failed for {cfile}: {e}")
+    def iter_msgs():
+        for path, res in zip(chat_keys, chat_results):
+            if isinstance(res, Exception):
+                print(f"parse_chat_file failed for {path}: {res}")
+            else:
+                yield from res
+        for path, res in zip(call_keys, call_results):
+            if isinstance(res, Exception):
+                print(f"parse_calls_file failed for {path}: {res}")
+            else:
+                for c in res:
+                    yield {
+                        "thread": None,
+                        "sender": c.get("number"),
+                        "receiver": None,
+                        "timestamp": c.get("timestamp"),
+                        "text": f"Call record type:{c.get('type')} duration:{c.get('duration')}"
+                    }
 
-    for callfile in manifest.get("calls", []):
-        try:
-            calls = parse_calls_file(callfile)
-            call_msgs = []
-            for c in calls:
-                call_msgs.append({
-                    "thread": None,
-                    "sender": c.get("number"),
-                    "receiver": None,
-                    "timestamp": c.get("timestamp"),
-                    "text": f"Call record type:{c.get('type')} duration:{c.get('duration')}"
-                })
-            if call_msgs:
-                indexer.add_messages(call_msgs)
-                total_messages += len(call_msgs)
-        except Exception as e:
-            print(f"parse_calls_file failed for {callfile}: {e}")
+    try:
+        total_messages += indexer.add_messages(iter_msgs())
+    except Exception as e:
+        print(f"add_messages failed: {e}")
 
     # compute embeddings (no-op if embeddings disabled)
     try:
         indexer.compute_and_store_embeddings()
     except Exception as e:
         print("embedding build failed:", e)
+    # cached query responses predate the new data
+    for c in query_caches.values():
+        c.clear()
 
-    return JSONResponse({
+    return FastJSONResponse({
         "status": "ok",
         "messages_indexed": total_messages,
         "extract_method": extract_method,
@@ -151,43 +481,70 @@ async def upload_ufdr(file: UploadFile = File(...)):
 @app.post("/query")
 async def query(q: str = Form(...)):
     qlower = q.lower()
-    if any(tok in qlower for tok in ("crypto", "bitcoin", "ethereum", "wallet")):
+    crypto_mode = any(tok in qlower for tok in ("crypto", "bitcoin", "ethereum", "wallet"))
+    fts_hits = None
+    if not crypto_mode and SEM_MIN and indexer.count_messages(SEM_MIN) < SEM_MIN:
+        try:
+            fts_hits = indexer.fts_search(q, limit=20, raise_errors=True)
+        except Exception:
+            # not valid FTS syntax (e.g. natural-language punctuation): no
+            # evidence the corpus lacks a match, so leave it to semantic search
+            fts_hits = []
+        else:
+            if not fts_hits:
+                return FastJSONResponse({"query": q, "count": 0, "results": [], "summary": None})
+    cache = query_caches["crypto" if crypto_mode else "search"]
+    q_emb = None if crypto_mode else indexer.embed_query(q)
+    cache_key = CRYPTO_CACHE_KEY if crypto_mode else q_emb
+    if cache_key is not None:
+        cached = cache.lookup(cache_key)
+        if cached is not None:
+            return FastJSONResponse({**cached, "query": q})
+    response = await answer_query(q, crypto_mode, q_emb, fts_hits)
+    if cache_key is not None:
+        cache.store(cache_key, response)
+    return FastJSONResponse(response)
+
+
+async def answer_query(q: str, crypto_mode: bool, q_emb=None, fts_hits=None):
+    """
+    Run the crypto-regex or FTS+semantic search for q and build the response body.
+    fts_hits, if the caller already ran the FTS query, is reused.
+    """
+    if crypto_mode:
+        # prefilter inside SQLite so only candidate rows cross into Python;
+        # iterate the cursor rather than materializing the result set
         cur = indexer.conn.cursor()
-        rows = cur.execute("SELECT id,text FROM messages LIMIT 20000;").fetchall()
+        rows = cur.execute("SELECT id,text FROM messages WHERE HAS_CRYPTO(text) LIMIT 20000;")
         hits = []
         for r in rows:
             txt = r[1] or ""
-            for pat in CRYPTO_PATTERNS:
-                m = pat.search(txt)
-                if m:
-                    hits.append({"id": r[0], "text": txt, "match": m.group(0)})
+            for match in crypto_matches(txt):
+                hits.append({"id": r[0], "text": txt, "match": match})
         summary = None
         if hits and summarizer:
             try:
-                joined = "\n".join([h["text"] for h in hits[:10]])
-                summary = summarizer("summarize: " + joined, max_length=128, do_sample=False)[0]["generated_text"]
+                joined = join_prompt((h["text"] for h in hits[:10]), "\n")
+                summary = await summarize("summarize: " + joined, max_length=128)
             except Exception:
                 summary = joined[:1000]
-        return JSONResponse({"query": q, "mode": "crypto_regex", "count": len(hits), "hits": hits, "summary": summary})
+        return {"query": q, "mode": "crypto_regex", "count": len(hits), "hits": hits, "summary": summary}
 
-    fts_hits = indexer.fts_search(q, limit=20)
-    semantic_hits = indexer.semantic_search(q, top_k=10)
-    bucket = {}
-    for h in (fts_hits or []) + (semantic_hits or []):
-        if not h:
-            continue
-        bucket[h["id"]] = h
-    merged = list(bucket.values())[:25]
+    if fts_hits is None:
+        fts_hits = indexer.fts_search(q, limit=20)
+    semantic_hits = indexer.semantic_search(q, top_k=10, q_emb=q_emb)
+    merged = rrf_merge([fts_hits, semantic_hits], limit=25)
 
     summary = None
-    if merged and summarizer:
+    # a single hit is its own summary; skip generation
+    if len(merged) >= 2 and summarizer:
         try:
-            joined = "\n\n".join([f"{m.get('sender') or ''}: {m.get('text')}" for m in merged[:10]])
-            summary = summarizer("summarize: " + joined, max_length=120, do_sample=False)[0]["generated_text"]
+            joined = join_prompt((f"{m.get('sender') or ''}: {m.get('text')}" for m in merged[:10]), "\n\n")
+            summary = await summarize("summarize: " + joined, max_length=120)
         except Exception as e:
             print("summarizer failed", e)
 
-    return JSONResponse({"query": q, "count": len(merged), "results": merged, "summary": summary})
+    return {"query": q, "count": len(merged), "results": merged, "summary": summary}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+# query_cache.py
+import time
+import threading
+import numpy as np
+from typing import Any, Dict, Optional
+
+
+class SemanticCache:
+    """
+    In-process cache of /query responses keyed by query embedding.
+    A lookup hits when a cached query's embedding has cosine >= threshold with
+    the new one (embeddings are L2-normalized, so cosine is a dot product).
+    Entries expire after ttl seconds; when full, the least recently used entry
+    is evicted. At <= max_entries vectors a numpy scan is cheaper than
+    maintaining a FAISS index with removals.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 300.0, max_entries: int = 1024):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._vecs = None  # (max_entries, d) float32, allocated on first store
+        self._responses = [None] * max_entries
+        self._stored_at = np.zeros(max_entries)
+        self._used_at = np.zeros(max_entries)
+        self._live = np.zeros(max_entries, dtype=bool)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, emb: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return the cached response for the nearest live query, or None."""
+        now = time.monotonic()
+        with self._lock:
+            if self._vecs is not None:
+                self._live &= (now - self._stored_at) < self.ttl
+                if self._live.any():
+                    sims = self._vecs @ emb
+                    sims[~self._live] = -np.inf
+                    i = int(np.argmax(sims))
+                    if sims[i] >= self.threshold:
+                        self._used_at[i] = now
+                        self.hits += 1
+                        return self._responses[i]
+            self.misses += 1
+            return None
+
+    def store(self, emb: np.ndarray, response: Dict[str, Any]):
+        now = time.monotonic()
+        with self._lock:
+            if self._vecs is None:
+                self._vecs = np.zeros((self.max_entries, emb.shape[0]), dtype=np.float32)
+            self._live &= (now - self._stored_at) < self.ttl
+            free = np.flatnonzero(~self._live)
+            i = int(free[0]) if len(free) else int(np.argmin(self._used_at))
+            self._vecs[i] = emb
+            self._responses[i] = response
+            self._stored_at[i] = now
+            self._used_at[i] = now
+            self._live[i] = True
+
+    def clear(self):
+        """Drop all entries (e.g. after new data is indexed)."""
+        with self._lock:
+            self._live[:] = False
+            self._responses = [None] * self.max_entries
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": int(self._live.sum()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
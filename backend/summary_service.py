@@ -0,0 +1,69 @@
+# summary_service.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+
+class SummaryService:
+    """
+    Micro-batching front for a text2text pipeline.
+    Callers `await submit(prompt, max_length)`; a background task drains up to
+    max_batch pending prompts within a window-second collection window and
+    runs them through the model in one batched call on a dedicated thread, so
+    generation never blocks the event loop and tensor overhead is shared
+    across concurrent requests.
+    """
+
+    def __init__(self, fn: Callable[..., Any], max_batch: int = 8, window: float = 0.02):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.window = window
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, prompt: str, max_length: int) -> str:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # queue and worker are bound to the loop that first uses them
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+        fut = loop.create_future()
+        await self._queue.put((prompt, max_length, fut))
+        return await fut
+
+    async def _run(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # the pipeline takes one max_length per call
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[1], []).append(item)
+            for max_length, items in groups.items():
+                prompts = [p for p, _, _ in items]
+                try:
+                    outs = await loop.run_in_executor(self._executor, self._generate, prompts, max_length)
+                except Exception as e:
+                    for _, _, fut in items:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+                for (_, _, fut), out in zip(items, outs):
+                    if not fut.done():
+                        fut.set_result(out)
+
+    def _generate(self, prompts: List[str], max_length: int) -> List[str]:
+        outs = self.fn(prompts, max_length=max_length, do_sample=False, batch_size=len(prompts))
+        return [(o[0] if isinstance(o, list) else o)["generated_text"] for o in outs]
@@ -1,12 +1,71 @@
 # ufdr2dir_wrapper.py
 import subprocess
 import os
+import shutil
+import tempfile
+import inspect
+import functools
+import threading
+import importlib.util
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional
+
+
+def _call_with_timeout(fn: Callable[..., Any], args: tuple, timeout: float) -> bool:
+    """
+    Run fn(*args) on a fresh daemon thread (so a hung call abandoned on timeout
+    never blocks later ones). True if it returned, or exited with status 0,
+    within timeout.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            fn(*args)
+            outcome["ok"] = True
+        except SystemExit as e:
+            # CLI-style entry points end with sys.exit()
+            outcome["ok"] = e.code in (None, 0)
+        except BaseException:
+            outcome["ok"] = False
+
+    t = threading.Thread(target=target, name="ufdr2dir", daemon=True)
+    t.start()
+    t.join(timeout)
+    return outcome.get("ok", False)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_entry(script: str) -> Optional[Callable[..., Any]]:
+    """
+    Import a UFDR2DIR script once and return its main(ufdr_path, out_dir)
+    entry point, or None if it has no such callable (or fails to import).
+    """
+    try:
+        spec = importlib.util.spec_from_file_location("ufdr2dir", script)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+    except (Exception, SystemExit):
+        # includes scripts that run their CLI (and exit) at import time
+        return None
+    entry = getattr(mod, "main", None)
+    if not callable(entry):
+        return None
+    try:
+        inspect.signature(entry).bind("ufdr", "out")
+    except (TypeError, ValueError):
+        # argv-driven main(); only usable as a subprocess
+        return None
+    return entry
+
 
 def run_ufdr2dir(ufdr_path: str, out_dir: str, ufdr2dir_repo: Optional[str] = None, timeout: int = 300) -> bool:
     """
     Optional helper to run UFDR2DIR if you have it cloned.
+    The script is imported once and its main() called in-process, writing to a
+    private temp dir that is moved into out_dir only on success (a timed-out
+    call cannot be killed, so it is left writing to a discarded dir). Scripts
+    without a main(ufdr_path, out_dir) entry point are run as a subprocess.
     If not available, caller should fallback to extract_ufdr.
     """
     ufdr_path = str(ufdr_path)
@@ -22,8 +81,19 @@ def run_ufdr2dir(ufdr_path: str, out_dir: str, ufdr2dir_repo: Optional[str] = No
     script = next((c for c in candidates if c.exists()), None)
     try:
         if script:
-            cmd = ["python", str(script), ufdr_path, out_dir]
-            subprocess.check_call(cmd, timeout=timeout)
+            entry = _load_entry(str(script.resolve()))
+            if entry is not None:
+                tmp_dir = tempfile.mkdtemp(prefix=".ufdr2dir-", dir=Path(out_dir).parent)
+                try:
+                    if not _call_with_timeout(entry, (ufdr_path, tmp_dir), timeout):
+                        return False
+                    for name in os.listdir(tmp_dir):
+                        shutil.move(os.path.join(tmp_dir, name), out_dir)
+                finally:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+            else:
+                cmd = ["python", str(script), ufdr_path, out_dir]
+                subprocess.check_call(cmd, timeout=timeout)
             return any(Path(out_dir).iterdir())
     except Exception:
         return False